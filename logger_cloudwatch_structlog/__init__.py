@@ -1,2 +1,3 @@
-from .functions import setup_logging, get_logger, setup_and_get_logger
-from .custom_processors import AWSCloudWatchLogs, PasswordCensor
+from .functions import (setup_logging, get_logger, get_logger_eager, setup_and_get_logger, RawStdoutHandler,
+                        RawBytesLogger, RawBytesLoggerFactory)
+from .custom_processors import AWSCloudWatchLogs, CensorAndRender, PasswordCensor
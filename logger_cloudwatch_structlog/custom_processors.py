@@ -1,8 +1,27 @@
-import json
 from typing import List, Dict
+import functools
+import json
+import operator
+import sys
 from structlog.processors import _json_fallback_handler
 from structlog.typing import Any, Callable, EventDict, Union, WrappedLogger
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson is optional (`pip install logger_cloudwatch_structlog[fast]`), the stdlib json is the fallback.
+_default_serializer = orjson.dumps if orjson is not None else json.dumps
+_OPT_APPEND_NEWLINE = orjson.OPT_APPEND_NEWLINE if orjson is not None else 0
+
+# Handler for the objects that the serializer can't encode. It supports ``__structlog__`` and falls back to repr().
+# It is a private name of structlog, so it is only referenced here. Pass ``default`` to AWSCloudWatchLogs to replace it.
+_DEFAULT_FALLBACK = _json_fallback_handler
+
+# Value that replaces the censored words. Interned, so it is always the same object.
+_CENSORED = sys.intern("*CENSORED*")
+
 
 class AWSCloudWatchLogs:
     """This class is from https://github.com/openlibraryenvironment/serverless-zoom-recordings
@@ -16,14 +35,22 @@ class AWSCloudWatchLogs:
         serializer (Callable[..., Union[str, bytes]], optional): A :func:`json.dumps`-compatible callable that will be
             used to format the string.  This can be used to use alternative JSON encoders like `simplejson
             <https://pypi.org/project/simplejson/>`_ or `RapidJSON <https://pypi.org/project/python-rapidjson/>`_
-            (faster but Python 3-only). Default: :func:`json.dumps`.
+            (faster but Python 3-only). If it is :func:`orjson.dumps`, the whole log line is rendered as ``bytes``.
+            Default: :func:`orjson.dumps` if orjson is installed, otherwise :func:`json.dumps`.
+        as_str (bool, optional): If True, a log line rendered as ``bytes`` is decoded to ``str`` once, after it is
+            joined. Use it with :func:`orjson.dumps` when the consumers expect str, e.g. the handlers of ``logging``.
+            Defaults to False.
         **dumps_kw: Arbitrary keyword arguments. Are passed unmodified to *serializer*. If *default* is passed, it
-            will disable support for ``__structlog__``-based serialization.
+            will disable support for ``__structlog__``-based serialization. With :func:`orjson.dumps`, ``sort_keys``
+            is translated to ``orjson.OPT_SORT_KEYS``.
 
         """
 
-    def __init__(self, callouts: List = None, serializer: Callable[..., Union[str, bytes]] = json.dumps,
-                 **dumps_kw: Any,) -> None:
+    __slots__ = ("_callout_one_key", "_callout_two_key", "_bytes", "_as_str", "_dumps_kw", "_dumps", "_dump",
+                 "_header_cache", "_render")
+
+    def __init__(self, callouts: List = None, serializer: Callable[..., Union[str, bytes]] = _default_serializer,
+                 as_str: bool = False, **dumps_kw: Any,) -> None:
         try:
             self._callout_one_key = callouts[0]
         except (IndexError, TypeError):
@@ -32,23 +59,143 @@ class AWSCloudWatchLogs:
             self._callout_two_key = callouts[1]
         except (IndexError, TypeError):
             self._callout_two_key = None
-        dumps_kw.setdefault("default", _json_fallback_handler)
+        # orjson only accepts ``default`` and ``option``, and it returns bytes, so the header must be bytes too.
+        self._bytes = _is_orjson(serializer)
+        self._as_str = as_str
+        if self._bytes and dumps_kw.pop("sort_keys", False):
+            dumps_kw["option"] = (dumps_kw.get("option") or 0) | orjson.OPT_SORT_KEYS
+        dumps_kw.setdefault("default", _DEFAULT_FALLBACK)
         self._dumps_kw = dumps_kw
         self._dumps = serializer
+        self._dump = _bind_serializer(serializer, dumps_kw)
+        # structlog passes the method name ("info", "error", ...), so this only holds a handful of headers.
+        self._header_cache: Dict[str, Union[str, bytes]] = {}
+        self._render = self._make_render()
+
+    @property
+    def renders_bytes(self) -> bool:
+        """True if the log lines are rendered as bytes, which is the case with :func:`orjson.dumps` without as_str."""
+        return self._bytes and not self._as_str
+
+    @property
+    def appends_newline(self) -> bool:
+        """True if the log lines end with a newline, which orjson appends with ``orjson.OPT_APPEND_NEWLINE``."""
+        return self._bytes and bool((self._dumps_kw.get("option") or 0) & _OPT_APPEND_NEWLINE)
 
-    def __call__(self, _, name: str, event_dict: EventDict) -> Union[str, bytes]:
-        """The return type of this depends on the return type of self._dumps."""
+    # Python looks up __call__ on the class, so an instance attribute can't replace it. This property hands the render
+    # function generated in __init__ to the caller, without the extra call of a delegating __call__.
+    __call__ = property(operator.attrgetter("_render"))
 
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"callouts": (self._callout_one_key, self._callout_two_key), "serializer": self._dumps,
+                "as_str": self._as_str, "dumps_kw": self._dumps_kw}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        dumps_kw = state.pop("dumps_kw")
+
+        self.__init__(**state, **dumps_kw)
+
+    def _make_render(self) -> Callable[[WrappedLogger, str, EventDict], Union[str, bytes]]:
+        """
+        Generate the render function for this configuration. The callout keys, the serializer and the header cache are
+        bound as local variables, only the configured callouts are looked up, and the str or bytes handling is decided
+        here instead of on every call. The return type of the function depends on the return type of self._dumps,
+        unless as_str decodes the bytes.
+
+        Returns:
+            Callable: Function that renders an EventDict, with the signature of a processor.
+
+        """
+        keys = [key for key in (self._callout_one_key, self._callout_two_key) if key is not None]
+        # Only this fixed code is compiled, the configured values are passed in the namespace.
+        namespace = {"headers": self._header_cache, "cache_header": self._cache_header, "dump": self._dump}
+        namespace.update((f"key_{i}", key) for i, key in enumerate(keys))
+
+        arguments = ["_", "name", "event_dict", "_headers=headers", "_cache_header=cache_header", "_dump=dump"]
+        arguments += [f"_key_{i}=key_{i}" for i in range(len(keys))]
+        decode = ".decode()" if self._bytes and self._as_str else ""
+        lines = [f"def render({', '.join(arguments)}):",
+                 "    header = _headers.get(name) or _cache_header(name)"]
+        if not keys:
+            lines.append(f"    return (header + _dump(event_dict)){decode}")
+        else:
+            encode = ".encode()" if self._bytes else ""
+            lines.append("    parts = [header]")
+            for i in range(len(keys)):
+                lines += [f"    callout = event_dict.get(_key_{i})",
+                          "    if callout:",
+                          f"        parts.append(f'\"{{callout}}\" '{encode})"]
+            lines += ["    parts.append(_dump(event_dict))",
+                      f"    return {'b' if self._bytes else ''}''.join(parts){decode}"]
+
+        exec(compile("\n".join(lines), f"<{type(self).__name__} render>", "exec"), namespace)
+
+        return namespace["render"]
+
+    def _cache_header(self, name: str) -> Union[str, bytes]:
         header = f'[{name.upper()}] '
-        callout_one = event_dict.get(self._callout_one_key, None)
-        callout_two = event_dict.get(self._callout_two_key, None)
+        if self._bytes:
+            header = header.encode()
+
+        return self._header_cache.setdefault(name, header)
 
-        if callout_one:
-            header += f'"{callout_one}" '
-        if callout_two:
-            header += f'"{callout_two}" '
 
-        return header + self._dumps(event_dict, **self._dumps_kw)
+class CensorAndRender(AWSCloudWatchLogs):
+    """
+    Censor words in ``event_dict`` and render it as a log line compatible with AWS CloudWatch Logs. It does the same as
+    ``PasswordCensor`` followed by ``AWSCloudWatchLogs``, but in a single processor, which saves one processor call per
+    log line. It must be the last processor.
+
+    Args:
+        wordlist: (List | None, optional) List with words to be censored in the event_dict, if they are
+                  present. Defaults to None.
+        callouts (List | None, optional): Are printed in clear-text on the front of the log line. Only the first two
+            items of this list are called out. Defaults to None.
+        serializer (Callable[..., Union[str, bytes]], optional): A :func:`json.dumps`-compatible callable that will be
+            used to format the string. Default: :func:`orjson.dumps` if orjson is installed, otherwise
+            :func:`json.dumps`.
+        as_str (bool, optional): If True, a log line rendered as ``bytes`` is decoded to ``str``. Defaults to False.
+        **dumps_kw: Arbitrary keyword arguments. Are passed unmodified to *serializer*.
+
+    """
+
+    __slots__ = ("_wordlist", "_wordset", "_call")
+
+    def __init__(self, wordlist: List = None, callouts: List = None,
+                 serializer: Callable[..., Union[str, bytes]] = _default_serializer, as_str: bool = False,
+                 **dumps_kw: Any,) -> None:
+        super().__init__(callouts=callouts, serializer=serializer, as_str=as_str, **dumps_kw)
+        self._wordlist = wordlist
+        self._wordset = _freeze_wordlist(wordlist)
+        self._call = self._make_call()
+
+    # Like AWSCloudWatchLogs, the processor is the function generated in __init__.
+    __call__ = property(operator.attrgetter("_call"))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {**super().__getstate__(), "wordlist": self._wordlist}
+
+    def _make_call(self) -> Callable[[WrappedLogger, str, EventDict], Union[str, bytes]]:
+        """
+        Create the function that censors and renders an EventDict. Without words to censor, it is the render function.
+
+        Returns:
+            Callable: Function that censors and renders an EventDict, with the signature of a processor.
+
+        """
+        if not self._wordset:
+            return self._render
+
+        # The default arguments are fast locals, unlike the attribute and global lookups.
+        def censor_and_render(_, name: str, event_dict: EventDict, _wordset: frozenset = self._wordset,
+                              _censored: str = _CENSORED, _render: Callable = self._render) -> Union[str, bytes]:
+            for key in _wordset.intersection(event_dict):
+                if event_dict[key]:
+                    event_dict[key] = _censored
+
+            return _render(_, name, event_dict)
+
+        return censor_and_render
 
 
 class PasswordCensor:
@@ -57,9 +204,12 @@ class PasswordCensor:
 
     callouts (List | None, optional)
 
+    The words are kept in a frozenset and only the keys of ``event_dict`` are looked up in it, so the cost per log line
+    does not grow with the size of the wordlist.
+
     Args:
         wordlist: (List | None, optional) List with words to be censored in the event_dict, if they are
-                  present. Defaults to None.
+                  present. A set or a frozenset is accepted too. Defaults to None.
 
     """
 
@@ -90,30 +240,81 @@ def _make_censor(wordlist: List) -> Callable[[EventDict], EventDict]:
         wordlist (List | None): List with words to be censored in the event_dict if they are present
 
     Returns:
-        Callable: Function that censor words from an EventDict.
+        Callable: Function that censor words from an EventDict. It visits the keys of the EventDict, not the words.
 
     Raises:
-        ValueError: If wordlist is not a tuple or a list.
+        ValueError: If wordlist is not a tuple, a list, a set or a frozenset.
 
     """
-    if wordlist is None:
+    wordset = _freeze_wordlist(wordlist)
+
+    if not wordset:
 
         def nothing_to_do(event_dict: EventDict) -> EventDict:
             return event_dict
 
         return nothing_to_do
 
-    if not (type(wordlist) is tuple) and not (type(wordlist) is list):
-        raise ValueError("The wordlist must be a tuple or a list")
-
-    def censor_every_word(event_dict: EventDict) -> EventDict:
+    # The default arguments are fast locals, unlike the closure and global lookups.
+    def censor_every_word(event_dict: EventDict, _wordset: frozenset = wordset,
+                          _censored: str = _CENSORED) -> EventDict:
 
-        for key in wordlist:
-            pw = event_dict.get(key)
-
-            if pw:
-                event_dict[key] = "*CENSORED*"
+        # The intersection only yields the keys that are present, so lines without words to censor are cheap.
+        for key in _wordset.intersection(event_dict):
+            if event_dict[key]:
+                event_dict[key] = _censored
 
         return event_dict
 
     return censor_every_word
+
+
+def _is_orjson(serializer: Callable[..., Union[str, bytes]]) -> bool:
+    """Return True if the serializer is :func:`orjson.dumps`."""
+    return orjson is not None and serializer is orjson.dumps
+
+
+def _bind_serializer(serializer: Callable[..., Union[str, bytes]], dumps_kw: Dict[str, Any]) -> Callable:
+    """
+    Bind the keyword arguments to the serializer, so they are not unpacked on every call.
+
+    Args:
+        serializer (Callable[..., Union[str, bytes]]): A :func:`json.dumps`-compatible callable.
+        dumps_kw (Dict): Keyword arguments for the serializer.
+
+    Returns:
+        Callable: Function that serializes an EventDict.
+
+    """
+    if _is_orjson(serializer) and dumps_kw.keys() <= {"default", "option"}:
+        # orjson parses literal keyword arguments much faster than the ones unpacked from a dict.
+        def dump(event_dict: EventDict, _dumps: Callable = serializer, _default: Callable = dumps_kw.get("default"),
+                 _option: int = dumps_kw.get("option")) -> bytes:
+            return _dumps(event_dict, default=_default, option=_option)
+
+        return dump
+
+    return functools.partial(serializer, **dumps_kw)
+
+
+def _freeze_wordlist(wordlist: List) -> frozenset:
+    """
+    Validate the wordlist and freeze it into a set of words.
+
+    Args:
+        wordlist (List | None): List with words to be censored in the event_dict if they are present
+
+    Returns:
+        frozenset: The words to be censored. It is empty if wordlist is None.
+
+    Raises:
+        ValueError: If wordlist is not a tuple, a list, a set or a frozenset.
+
+    """
+    if wordlist is None:
+        return frozenset()
+
+    if type(wordlist) not in (tuple, list, set, frozenset):
+        raise ValueError("The wordlist must be a tuple, a list, a set or a frozenset")
+
+    return frozenset(wordlist)
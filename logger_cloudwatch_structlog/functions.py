@@ -1,21 +1,112 @@
-from typing import List, Tuple, Callable, Union, Any
+from typing import List, Iterable, Callable, Union, Any
 import json
 import sys
 import logging
+import warnings
 import structlog
 
-from logger_cloudwatch_structlog.custom_processors import AWSCloudWatchLogs, PasswordCensor
+from logger_cloudwatch_structlog.custom_processors import (AWSCloudWatchLogs, CensorAndRender, PasswordCensor,
+                                                           _default_serializer, _is_orjson, _OPT_APPEND_NEWLINE)
 
 # This is from https://github.com/openlibraryenvironment/serverless-zoom-recordings
-_NOISY_LOG_SOURCES = ("boto", "boto3", "botocore")
+_NOISY_LOG_SOURCES = frozenset(("boto", "boto3", "botocore"))
+# Callouts of the one-fits-all solution.
+_DEFAULT_CALLOUTS = ("status_code", "event")
+# Arguments and resulting structlog configuration of the last setup done by setup_and_get_logger(), None if it didn't
+# configure structlog yet.
+_setup_arguments = None
+_setup_config = None
+
+
+class RawStdoutHandler(logging.Handler):
+    """
+    Logging handler that writes the message of each record straight to ``sys.stdout.buffer``, followed by a newline.
+    It skips the ``logging.Formatter`` for the plain messages, and messages that are already bytes (e.g. rendered by
+    orjson) are written without encoding them. Records with arguments, exception or stack information are formatted
+    as usual. The text layer of ``sys.stdout`` is flushed first, so the log lines keep their order with ``print()``.
+    If ``sys.stdout`` has no buffer (e.g. ``io.StringIO``), the messages are written to it as str.
+
+    Args:
+        level: (int, optional) Sets the threshold for this handler to level. Defaults to logging.NOTSET.
+    """
+
+    def __init__(self, level: int = logging.NOTSET) -> None:
+        super().__init__(level)
+        self._stream = sys.stdout
+        self._buffer = getattr(self._stream, "buffer", None)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            msg = record.msg
+            if record.args or record.exc_info or record.stack_info or not isinstance(msg, (str, bytes)):
+                msg = self.format(record)
+            # A single write, so the lines of different threads are never mixed.
+            if self._buffer is None:
+                if isinstance(msg, bytes):
+                    msg = msg.decode()
+                self._stream.write(msg + "\n")
+                self._stream.flush()
+            else:
+                if isinstance(msg, str):
+                    msg = msg.encode()
+                # Whatever print() left in the text layer goes first.
+                self._stream.flush()
+                self._buffer.write(msg + b"\n")
+                self._buffer.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class RawBytesLogger(structlog.BytesLogger):
+    """
+    A ``structlog.BytesLogger`` that writes the messages as they are, without appending a newline. Use it when the final
+    processor already ends the log lines with a newline, e.g. ``AWSCloudWatchLogs`` with
+    ``option=orjson.OPT_APPEND_NEWLINE``.
+
+    Args:
+        file: (BinaryIO | None, optional) File to print to. Defaults to ``sys.stdout.buffer``.
+    """
+
+    __slots__ = ()
+
+    def msg(self, message: bytes) -> None:
+        with self._lock:
+            self._write(message)
+            self._flush()
+
+    log = debug = info = warn = warning = msg
+    fatal = failure = err = error = critical = exception = msg
+
+
+class RawBytesLoggerFactory(structlog.BytesLoggerFactory):
+    """
+    Produce ``RawBytesLogger`` instances. To be used with ``structlog.configure``'s ``logger_factory``. Positional
+    arguments are silently ignored.
+
+    Args:
+        file: (BinaryIO | None, optional) File to print to. Defaults to ``sys.stdout.buffer``.
+    """
+
+    __slots__ = ()
+
+    def __call__(self, *args: Any) -> RawBytesLogger:
+        return RawBytesLogger(self._file)
 
 
 def setup_logging(wordlist_to_censor: List = None,
                   callouts: List = None,
                   processors: List = None,
-                  serializer: Callable[..., Union[str, bytes]] = json.dumps,
+                  serializer: Callable[..., Union[str, bytes]] = None,
                   level: int = logging.INFO,
-                  noisy_log_sources: Tuple = _NOISY_LOG_SOURCES,
+                  noisy_log_sources: Iterable = _NOISY_LOG_SOURCES,
+                  fused: bool = False,
+                  stdlib_logging: bool = False,
+                  use_bytes_factory: bool = None,
+                  fast_defaults: bool = False,
+                  positional_args: bool = None,
+                  decode_bytes: bool = None,
                   **serializer_kw):
     """
     Configure logging for the application.
@@ -32,23 +123,64 @@ def setup_logging(wordlist_to_censor: List = None,
         callouts (List | None, optional): Are printed in clear-text on the front of the log line. Only the first two
                  items of this list are called out.
         serializer: (Callable[..., Union[str, bytes]], optional): A :func:`json.dumps`-compatible callable that will be
-                    used to format the string. Defaults to json.dumps.
+                    used to format the string. If it is orjson.dumps, the log lines are rendered as bytes and written
+                    straight to ``sys.stdout.buffer``. Defaults to None, which is json.dumps with stdlib_logging,
+                    because the handlers of ``logging`` expect str messages. Otherwise, it is orjson.dumps if orjson
+                    is installed, or json.dumps. With stdlib_logging, the default processors decode the log lines
+                    rendered by orjson.dumps to str.
         level: (int, optional) Sets the threshold for this logger to level. Logging messages which are less severe than
                level will be ignored. Defaults to logging.INFO.
-        noisy_log_sources (Tuple | None, optional): Tuple of sources that output a lot of unnecessary messages. Defaults
-                          to _NOISY_LOG_SOURCES.
+        noisy_log_sources (Iterable | None, optional): Sources that output a lot of unnecessary messages, e.g. a tuple
+                          or a frozenset. Defaults to _NOISY_LOG_SOURCES.
+        fused (bool, optional): If True, the default processors censor and render the log line in a single processor
+              (``CensorAndRender``) after merging the thread-local context. Defaults to False.
+        stdlib_logging (bool, optional): If True, the log lines are passed through the stdlib logging machinery
+                       (``structlog.stdlib.BoundLogger`` and ``structlog.stdlib.LoggerFactory``), so the handlers of
+                       ``logging`` are used, and it is configured with ``logging.basicConfig`` to print them with a
+                       ``RawStdoutHandler``. Otherwise, a bound logger created by
+                       ``structlog.make_filtering_bound_logger`` drops the messages below level before any processor
+                       runs, and the log lines are printed directly to stdout. Defaults to False.
+        use_bytes_factory (bool | None, optional): If True, the log lines are bytes and a
+                          ``structlog.BytesLoggerFactory`` writes them to ``sys.stdout.buffer``. If the last processor
+                          is an ``AWSCloudWatchLogs`` that appends the newline, a ``RawBytesLoggerFactory`` is used
+                          instead. With orjson, the default processors let it append the newline while encoding. If
+                          False, they are str and printed to ``sys.stdout``, and the default processors decode the
+                          log lines rendered by orjson. It is ignored with stdlib_logging. Defaults to None, which
+                          uses bytes if the last processor is an ``AWSCloudWatchLogs`` that renders bytes.
+        fast_defaults (bool, optional): If True, decode_bytes, and positional_args without stdlib_logging, default to
+                      False, so the default processors are shorter. Defaults to False.
+        positional_args (bool | None, optional): If True, the default processors perform %-style formatting of
+                        positional arguments with ``structlog.stdlib.PositionalArgumentsFormatter``. It is only needed
+                        with stdlib_logging, the other bound logger formats them itself. Defaults to None, which is
+                        True with stdlib_logging, otherwise the opposite of fast_defaults.
+        decode_bytes (bool | None, optional): If True, the default processors decode the bytes values to str with
+                     ``structlog.processors.UnicodeDecoder``. Defaults to None, which is the opposite of fast_defaults.
         **serializer_kw: Arbitrary keyword arguments. Are passed unmodified to *serializer*. If *default* is passed, it
             will disable support for ``__structlog__``-based serialization.
+
+    Raises:
+        ValueError: If use_bytes_factory is True, but the last processor is an ``AWSCloudWatchLogs`` that renders str,
+                    or if use_bytes_factory is False, but it renders bytes.
     """
 
+    if serializer is None:
+        serializer = json.dumps if stdlib_logging else _default_serializer
+
     if processors is None:
+        if positional_args is None:
+            # The stdlib bound logger passes the positional arguments on, so they are always formatted there.
+            positional_args = stdlib_logging or not fast_defaults
+        if decode_bytes is None:
+            decode_bytes = not fast_defaults
+
         processors = [
-            # If log level is too low, abort pipeline and throw away log entry.
-            structlog.stdlib.filter_by_level,
             # Add log level to event dict.
             structlog.stdlib.add_log_level,
+        ]
+        if positional_args:
             # Perform %-style formatting.
-            structlog.stdlib.PositionalArgumentsFormatter(),
+            processors.append(structlog.stdlib.PositionalArgumentsFormatter())
+        processors += [
             # Add a timestamp in ISO 8601 format.
             structlog.processors.TimeStamper(fmt="iso"),
             # If the "stack_info" key in the event dict is true, remove it and
@@ -58,15 +190,57 @@ def setup_logging(wordlist_to_censor: List = None,
             # sys.exc_info() tuple, remove "exc_info" and render the exception
             # with traceback into the "exception" key.
             structlog.processors.format_exc_info,
-            # If some value is in bytes, decode it to a unicode str.
-            structlog.processors.UnicodeDecoder(),
-            # Censor the words
-            PasswordCensor(wordlist=wordlist_to_censor),
-            # Merge in a global (thread-local) context.
-            structlog.threadlocal.merge_threadlocal,
-            # Render the final event dict as JSON.
-            AWSCloudWatchLogs(callouts=callouts, serializer=serializer, **serializer_kw),
         ]
+        if decode_bytes:
+            # If some value is in bytes, decode it to a unicode str.
+            processors.append(structlog.processors.UnicodeDecoder())
+        # The handlers of logging and the PrintLogger expect str, so the log lines rendered by orjson are decoded.
+        as_str = stdlib_logging or use_bytes_factory is False
+        if _is_orjson(serializer) and not stdlib_logging and use_bytes_factory is not False:
+            # orjson appends the newline while encoding, so a RawBytesLogger writes the log lines as they are.
+            serializer_kw["option"] = (serializer_kw.get("option") or 0) | _OPT_APPEND_NEWLINE
+        if fused:
+            processors += [
+                # Merge in a global (thread-local) context.
+                structlog.threadlocal.merge_threadlocal,
+                # Censor the words and render the final event dict as JSON.
+                CensorAndRender(wordlist=wordlist_to_censor, callouts=callouts, serializer=serializer,
+                                as_str=as_str, **serializer_kw),
+            ]
+        else:
+            processors += [
+                # Merge in a global (thread-local) context.
+                structlog.threadlocal.merge_threadlocal,
+                # Censor the words, including the ones of the thread-local context.
+                PasswordCensor(wordlist=wordlist_to_censor),
+                # Render the final event dict as JSON.
+                AWSCloudWatchLogs(callouts=callouts, serializer=serializer, as_str=as_str, **serializer_kw),
+            ]
+        if stdlib_logging:
+            # If log level is too low, abort pipeline and throw away log entry.
+            processors.insert(0, structlog.stdlib.filter_by_level)
+
+    if stdlib_logging:
+        wrapper_class = structlog.stdlib.BoundLogger
+        logger_factory = structlog.stdlib.LoggerFactory()
+    else:
+        # Methods below level are no-ops, so the processors don't run for them.
+        wrapper_class = structlog.make_filtering_bound_logger(level)
+        last_processor = processors[-1]
+        if use_bytes_factory is None:
+            use_bytes_factory = isinstance(last_processor, AWSCloudWatchLogs) and last_processor.renders_bytes
+        elif isinstance(last_processor, AWSCloudWatchLogs) and use_bytes_factory != last_processor.renders_bytes:
+            if use_bytes_factory:
+                raise ValueError("use_bytes_factory=True conflicts with the last processor, which renders str. Use "
+                                 "orjson.dumps as its serializer, without as_str=True")
+            raise ValueError("use_bytes_factory=False conflicts with the last processor, which renders bytes. Pass "
+                             "as_str=True to it or use a serializer that returns str")
+        if use_bytes_factory and isinstance(last_processor, AWSCloudWatchLogs) and last_processor.appends_newline:
+            logger_factory = RawBytesLoggerFactory()
+        elif use_bytes_factory:
+            logger_factory = structlog.BytesLoggerFactory()
+        else:
+            logger_factory = structlog.PrintLoggerFactory(sys.stdout)
 
     # This is from https://github.com/openlibraryenvironment/serverless-zoom-recordings
     # Structlog configuration
@@ -74,13 +248,15 @@ def setup_logging(wordlist_to_censor: List = None,
         processors=processors,
         context_class=dict,
         # `wrapper_class` is the bound logger that you get back from
-        # get_logger(). This one imitates the API of `logging.Logger`.
-        wrapper_class=structlog.stdlib.BoundLogger,
+        # get_logger(). Both options imitate the API of `logging.Logger`.
+        wrapper_class=wrapper_class,
         # `logger_factory` is used to create wrapped loggers that are used for
-        # OUTPUT. This one returns a `logging.Logger`. The final value (a JSON
-        # string) from the final processor (`JSONRenderer`) will be passed to
-        # the method of the same name as that you've called on the bound logger.
-        logger_factory=structlog.stdlib.LoggerFactory(),
+        # OUTPUT. It returns a `logging.Logger` with stdlib logging, otherwise
+        # a `BytesLogger` or a `PrintLogger` depending on the output of the
+        # final processor. The final value (a JSON string) from the final
+        # processor (`AWSCloudWatchLogs`) will be passed to the method of the
+        # same name as that you've called on the bound logger.
+        logger_factory=logger_factory,
         # Effectively freeze configuration after creating the first bound
         # logger.
         cache_logger_on_first_use=True,
@@ -89,14 +265,23 @@ def setup_logging(wordlist_to_censor: List = None,
     # This is from https://github.com/openlibraryenvironment/serverless-zoom-recordings
     # Stdlib logging configuration. `force` was added to reset the AWS-Lambda-supplied log handlers.
     # see: https://stackoverflow.com/questions/37703609/using-python-logging-with-aws-lambda#comment120413034_45624044
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=level,
-        force=True,
-    )
-    for source in noisy_log_sources:
-        logging.getLogger(source).setLevel(logging.WARNING)
+    # Without stdlib logging, the log lines don't go through its handlers, so only the noisy sources are configured.
+    if stdlib_logging:
+        logging.basicConfig(
+            format="%(message)s",
+            handlers=[RawStdoutHandler()],
+            level=level,
+            force=True,
+        )
+    # The logging lock is taken once for all sources. It is a private name, but it exists in every Python 3 version.
+    with logging._lock:
+        loggers = logging.Logger.manager.loggerDict
+        for source in noisy_log_sources:
+            logger = loggers.get(source)
+            if not isinstance(logger, logging.Logger):
+                # It is not created yet, or it is only a placeholder for its children.
+                logger = logging.getLogger(source)
+            logger.setLevel(logging.WARNING)
 
 
 def get_logger(*args: Any, **initial_values: Any) -> Any:
@@ -108,14 +293,39 @@ def get_logger(*args: Any, **initial_values: Any) -> Any:
         it depends on the factory what they mean.
         initial_values: (Any, optional): Values that are used to pre-populate the context.
 
-    Returns: A proxy that creates a correctly configured bound logger when necessary. We are using the default bound
-             logger `structlog.stdlib.BoundLogger`.
+    Returns: A proxy that creates a correctly configured bound logger when necessary. It is the wrapper class
+             configured by setup_logging().
     """
 
     return structlog.get_logger(*args, **initial_values)
 
 
-def setup_and_get_logger(**kwargs):
+def get_logger_eager(*args: Any, **initial_values: Any) -> Any:
+    """
+    Convenience function that returns an already bound structlog logger. Unlike get_logger(), it does not return a lazy
+    proxy, so it saves the proxy resolution on every log call. Use it to create a local logger if you log frequently,
+    e.g. in a tight loop. Call it after the logging is configured.
+
+    Args:
+        args: (Any, optional): Positional arguments that are passed unmodified to the logger factory. Therefore,
+        it depends on the factory what they mean.
+        initial_values: (Any, optional): Values that are used to pre-populate the context.
+
+    Returns: A correctly configured bound logger.
+    """
+
+    return structlog.get_logger(*args, **initial_values).bind()
+
+
+def setup_and_get_logger(*,
+                         wordlist_to_censor: List = None,
+                         callouts: List = _DEFAULT_CALLOUTS,
+                         processors: List = None,
+                         serializer: Callable[..., Union[str, bytes]] = None,
+                         level: int = logging.INFO,
+                         noisy_log_sources: Iterable = _NOISY_LOG_SOURCES,
+                         sort_keys: bool = False,
+                         **kwargs):
 
     """
     Configure logging for the application and return the logger. This function is a one-fits-all solution with some
@@ -123,20 +333,43 @@ def setup_and_get_logger(**kwargs):
     are used to pre-populate the context. If you need a more flexible solution, you can call setup_logging() and
     get_logger() separated.
 
+    If this function already configured structlog with the same arguments, and the structlog configuration is still
+    the one it made, e.g. because it is called again on a warm AWS Lambda, the setup is skipped and only the logger is
+    returned. Otherwise, e.g. if other code configured structlog in the meantime, the setup runs again. Calling it
+    with different arguments emits a warning, because the loggers that were already used keep the previous
+    configuration. The arguments are compared with ``==``, so objects created on every call, like a new processors
+    list or a lambda passed as ``default``, never match. Create them once, e.g. at module level, to skip the setup.
+
+    Args:
+        callouts: (List | None, optional) Are printed in clear-text on the front of the log line. Defaults to
+                  _DEFAULT_CALLOUTS.
+        sort_keys: (bool, optional) Sort the keys of the JSON output. Defaults to False.
+        wordlist_to_censor, processors, serializer, level, noisy_log_sources and **kwargs: Are passed to
+            setup_logging().
+
     Returns: A proxy that creates a correctly configured bound logger when necessary.
     """
 
-    # Check if we have the arguments for the setup. If they are not present, we use a one-fits-all solution.
-    wordlist_to_censor = kwargs.pop('wordlist_to_censor', None)
-    callouts = kwargs.pop('callouts', ["status_code", "event"])
-    processors = kwargs.pop('processors', None)
-    serializer = kwargs.pop('serializer', json.dumps)
-    level = kwargs.pop('level', logging.INFO)
-    noisy_log_sources = kwargs.pop('noisy_log_sources', _NOISY_LOG_SOURCES)
-    sort_keys = kwargs.pop('sort_keys', False)
+    global _setup_arguments, _setup_config
+
+    arguments = dict(wordlist_to_censor=wordlist_to_censor, callouts=callouts, processors=processors,
+                     serializer=serializer, level=level, noisy_log_sources=noisy_log_sources, sort_keys=sort_keys,
+                     **kwargs)
+    if arguments == _setup_arguments and structlog.get_config() == _setup_config:
+        return get_logger()
+    if _setup_arguments is not None and arguments != _setup_arguments:
+        warnings.warn("setup_and_get_logger() reconfigures logging with different arguments. The loggers that were "
+                      "already used keep the previous configuration", stacklevel=2)
+
+    # Only passed when requested, because not every serializer accepts it. AWSCloudWatchLogs translates it for orjson.
+    if sort_keys:
+        kwargs["sort_keys"] = sort_keys
 
     setup_logging(wordlist_to_censor=wordlist_to_censor, callouts=callouts, processors=processors,
-                  serializer=serializer, level=level, noisy_log_sources=noisy_log_sources, sort_keys=sort_keys,
-                  **kwargs)
+                  serializer=serializer, level=level, noisy_log_sources=noisy_log_sources, **kwargs)
+    _setup_arguments = arguments
+    # The processors list is copied, so changes made to it in place are noticed too.
+    _setup_config = structlog.get_config()
+    _setup_config["processors"] = list(_setup_config["processors"])
 
     return get_logger()
@@ -18,4 +18,5 @@ setuptools.setup(
     },
     packages=['logger_cloudwatch_structlog'],
     install_requires=['structlog>=22.2'],
+    extras_require={'fast': ['orjson']},
 )